@@ -2,138 +2,433 @@ import time
 import csv
 import json
 import os
+import asyncio
+import functools
+from urllib.parse import urljoin
+import aiohttp
+import lxml.html
+import queue
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from multiprocessing import Manager
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from selenium.common.exceptions import TimeoutException
 from webdriver_manager.chrome import ChromeDriverManager
 
 # Configuration
 SEARCH_URL = "https://www.metrocuadrado.com/apartamento-apartaestudio-casa/venta/nuevo/bogota?search=form"
 MAX_PAGES = 3
 OUTPUT_FILE = "metrocuadrado_properties.csv"
+# Rows are streamed here and only moved over OUTPUT_FILE once something was scraped
+PARTIAL_FILE = OUTPUT_FILE + ".part"
 HEADLESS = True
+# Ignore certificate errors (browser and HTTP fetches) to avoid privacy error
+# pages in restricted environments
+IGNORE_CERT_ERRORS = True
 DEBUG_DIR = "debug_screenshots"
+DEBUG = os.environ.get("SCRAPER_DEBUG") == "1"
+SCREENSHOT_BUFFER = 3
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36"
+MAX_CONCURRENT_REQUESTS = 8
+REQUEST_TIMEOUT = 30
+BROWSER_WORKERS = 4
+# Optional Selenium Grid, e.g.
+#   docker run --rm -p 4444:4444 --shm-size=2g \
+#       -e SE_NODE_MAX_SESSIONS=4 -e SE_NODE_OVERRIDE_MAX_SESSIONS=true selenium/standalone-chrome:4
+#   GRID_URL=http://localhost:4444/wd/hub
+# The grid allows one session by default; its max sessions must be at least
+# BROWSER_WORKERS, since each worker holds a session for its whole chunk.
+GRID_URL = os.environ.get("GRID_URL")
+FLUSH_EVERY = 20
+RESET_EVERY = 25
+
+# CSV columns
+FIELDNAMES = ["url", "title", "price", "currency", "location", "neighborhood", "city", "property_type",
+              "area", "rooms", "bathrooms", "parking", "stratum", "status", "description", "features",
+              "broker", "broker_phone", "images", "virtual_tour", "property_id", "scraped_at"]
+
+# CSV column -> key path into the listing JSON, for fields copied as-is
+LISTING_PATHS = [
+    ("title", ("title",)),
+    ("price", ("price", "value")),
+    ("currency", ("price", "currency")),
+    ("location", ("location", "formattedAddress")),
+    ("neighborhood", ("location", "neighborhood", "name")),
+    ("city", ("location", "city", "name")),
+    ("property_type", ("propertyType",)),
+    ("area", ("area",)),
+    ("rooms", ("rooms",)),
+    ("bathrooms", ("bathrooms",)),
+    ("parking", ("parking",)),
+    ("stratum", ("stratum",)),
+    ("status", ("status",)),
+    ("broker", ("broker", "name")),
+    ("broker_phone", ("broker", "phone")),
+    ("virtual_tour", ("virtualTourUrl",)),
+    ("property_id", ("id",)),
+]
+
+# Flattens line breaks and tabs in descriptions to keep CSV rows on one line
+_WS_TABLE = str.maketrans({"\n": " ", "\r": " ", "\t": " "})
+
+# Locators reused across pages
+SEL_TITLE = (By.CSS_SELECTOR, "h1[data-testid='title-listing-detail']")
+SEL_LISTING_DETAIL = (By.CSS_SELECTOR, "div.listing-detail")
+SEL_NEXT_DATA = (By.CSS_SELECTOR, "script#__NEXT_DATA__")
+SEL_ANY_CARDS = (By.CSS_SELECTOR, "div.m2-card-listing, div[data-testid='m2-card-listings-container']")
+SEL_NEXT_BUTTON = (By.XPATH, "//a[@aria-label='Siguiente página'] | //a[contains(@class, 'm2-pagination__next')]"
+                             " | //a[contains(text(), 'Siguiente')]")
+# Card detection methods in priority order: data-testid, class-based, generic
+CARD_SELECTORS = ["div[data-testid='m2-card-listings-container']", "div.m2-card-listing", "div[class*='card']"]
+
+# Chrome switches; background subsystems the scraper never uses are pruned to speed up launch
+CHROME_ARGS = (
+    "--disable-blink-features=AutomationControlled",
+    "--disable-infobars",
+    "--disable-gpu",
+    "--no-sandbox",
+    "--no-zygote",
+    "--disable-dev-shm-usage",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--metrics-recording-only",
+    "--mute-audio",
+    "--window-size=1920,1080",
+    "--allow-running-insecure-content",
+)
+
+# Parses __NEXT_DATA__ in the browser so it crosses the wire once, as an object
+NEXT_DATA_JS = "return JSON.parse(document.getElementById('__NEXT_DATA__').textContent);"
+
+# Counts matches for the first card selector that finds any, in one round-trip
+COUNT_CARDS_JS = ("for (const sel of arguments[0]) {"
+                  "  const n = document.querySelectorAll(sel).length;"
+                  "  if (n) return [sel, n];"
+                  "}"
+                  "return [null, 0];")
+
+# First listing link in the results, used to detect that a new page has rendered
+FIRST_LISTING_JS = ("const a = document.querySelector(\"a[href*='/inmueble/'], a[href*='/proyecto/']\");"
+                    "return a ? a.href : null;")
+
+# Resources the scraper never needs; blocked to cut page-load bytes
+BLOCKED_URLS = ["*.png", "*.jpg", "*.jpeg", "*.webp", "*.gif", "*.css", "*.woff*", "*.svg",
+                "*googletagmanager*", "*google-analytics*", "*doubleclick*"]
+
+# Resolved chromedriver path, shared with pool workers so it is only looked up once
+_DRIVER_PATH = os.environ.get("CHROMEDRIVER")
+
+# Most recent debug screenshots, only written to disk on failure
+_recent_screenshots = []
 
 # Create debug directory if it doesn't exist
-if not os.path.exists(DEBUG_DIR):
+if DEBUG and not os.path.exists(DEBUG_DIR):
     os.makedirs(DEBUG_DIR)
 
 
-def init_driver():
-    """Initialize Chrome WebDriver with verified options"""
+def get_driver_path():
+    """Resolve the chromedriver path once per process"""
+    global _DRIVER_PATH
+    if not _DRIVER_PATH:
+        _DRIVER_PATH = ChromeDriverManager().install()
+    return _DRIVER_PATH
+
+
+def _set_driver(path):
+    """Pool initializer: reuse the parent's resolved chromedriver path"""
+    global _DRIVER_PATH
+    _DRIVER_PATH = path
+
+
+@functools.lru_cache(maxsize=None)
+def build_options():
+    """Build the Chrome options once per process"""
     chrome_options = Options()
+    # Return from driver.get at DOMContentLoaded; the explicit waits cover the rest
+    chrome_options.page_load_strategy = "eager"
     if HEADLESS:
         chrome_options.add_argument("--headless=new")
-    chrome_options.add_argument("--disable-blink-features=AutomationControlled")
-    chrome_options.add_argument("--disable-infobars")
-    chrome_options.add_argument("--disable-dev-shm-usage")
-    chrome_options.add_argument("--no-sandbox")
-    chrome_options.add_argument("--window-size=1920,1080")
-    # Ignore certificate errors to avoid privacy error page in restricted
-    # environments
-    chrome_options.add_argument("--ignore-certificate-errors")
-    chrome_options.add_argument("--allow-running-insecure-content")
-    chrome_options.add_argument(
-        "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36")
+    for arg in CHROME_ARGS:
+        chrome_options.add_argument(arg)
+    if IGNORE_CERT_ERRORS:
+        chrome_options.add_argument("--ignore-certificate-errors")
+    chrome_options.add_argument(f"user-agent={USER_AGENT}")
 
     # Anti-detection options
     chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
     chrome_options.add_experimental_option('useAutomationExtension', False)
 
-    service = Service(ChromeDriverManager().install())
-    driver = webdriver.Chrome(service=service, options=chrome_options)
+    # Skip images and stylesheets - only the DOM and __NEXT_DATA__ are needed
+    prefs = {
+        "profile.managed_default_content_settings.images": 2,
+        "profile.managed_default_content_settings.stylesheets": 2,
+    }
+    chrome_options.add_experimental_option("prefs", prefs)
+    return chrome_options
+
+
+def init_driver():
+    """Initialize Chrome WebDriver with verified options"""
+    chrome_options = build_options()
+
+    if GRID_URL:
+        driver = webdriver.Remote(command_executor=GRID_URL, options=chrome_options)
+    else:
+        service = Service(get_driver_path())
+        driver = webdriver.Chrome(service=service, options=chrome_options)
+    # Misses from find_elements return immediately; waits are always explicit
+    driver.implicitly_wait(0)
 
     # Remove navigator.webdriver flag
     driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
 
+    # Block remaining heavy resources and trackers at the network layer
+    # (CDP is only available on local drivers)
+    if hasattr(driver, "execute_cdp_cmd"):
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URLS})
+
     return driver
 
 
 def take_screenshot(driver, name):
-    """Take screenshot and save to debug directory"""
+    """Capture a screenshot in debug mode, keeping only the most recent in memory"""
+    global _recent_screenshots
+    if not DEBUG:
+        return None
     timestamp = time.strftime("%Y%m%d-%H%M%S")
     filename = f"{DEBUG_DIR}/{name}_{timestamp}.png"
-    driver.save_screenshot(filename)
-    print(f"Saved screenshot: {filename}")
+    _recent_screenshots.append((filename, driver.get_screenshot_as_png()))
+    _recent_screenshots = _recent_screenshots[-SCREENSHOT_BUFFER:]
     return filename
 
 
+def flush_screenshots():
+    """Write buffered screenshots to the debug directory"""
+    for filename, png in _recent_screenshots:
+        with open(filename, "wb") as f:
+            f.write(png)
+        print(f"Saved screenshot: {filename}")
+    _recent_screenshots.clear()
+
+
+def dig(data, path, default=""):
+    """Follow a key path through nested dicts, returning default if it is missing or empty"""
+    for key in path:
+        data = data.get(key) if isinstance(data, dict) else None
+    return data if data not in (None, "") else default
+
+
+def parse_listing(json_data, url):
+    """Build a property record from a page's __NEXT_DATA__ JSON"""
+    listing = dig(json_data, ("props", "pageProps", "listing"), None)
+
+    if not listing:
+        return None
+
+    # Compile property data
+    row = {"url": url}
+    row.update({column: dig(listing, path) for column, path in LISTING_PATHS})
+
+    # Fields that need more than a single lookup
+    images = [img.get('url', '') for img in listing.get('images') or [] if img.get('url')]
+    row["currency"] = row["currency"] or "COP"
+    row["description"] = (listing.get('description') or '')[:500].translate(_WS_TABLE) + "..."
+    row["features"] = ", ".join(listing.get('features') or [])
+    row["images"] = "; ".join(images)
+    row["scraped_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+    return row
+
+
+async def fetch_listing(session, semaphore, url):
+    """Fetch a single property page over HTTP and parse its embedded JSON"""
+    async with semaphore:
+        print(f"Fetching property: {url}")
+        try:
+            async with session.get(url, headers={"User-Agent": USER_AGENT}) as response:
+                html = await response.text()
+
+            # The listing data is server-rendered into the __NEXT_DATA__ script tag
+            scripts = lxml.html.fromstring(html).xpath("//script[@id='__NEXT_DATA__']/text()")
+            if not scripts:
+                print(f"  - No __NEXT_DATA__ script in response for {url}")
+                return None
+
+            property_data = parse_listing(json.loads(scripts[0]), url)
+            if not property_data:
+                print(f"  - No listing data found in JSON for {url}")
+            return property_data
+
+        except aiohttp.ClientSSLError:
+            # Counted separately by fetch_listings so the browser fallback is visible
+            raise
+        except Exception as e:
+            print(f"  - Error fetching property {url}: {str(e)}")
+            return None
+
+
+async def fetch_listings(urls, save):
+    """Fetch property pages concurrently, saving each as it arrives; returns the URLs that failed"""
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+    connector = aiohttp.TCPConnector(ssl=not IGNORE_CERT_ERRORS)
+    failed = []
+    tls_failed = []
+
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        async def fetch_and_save(url):
+            try:
+                property_data = await fetch_listing(session, semaphore, url)
+            except aiohttp.ClientSSLError as e:
+                print(f"  - TLS error fetching property {url}: {str(e)}")
+                tls_failed.append(url)
+                property_data = None
+            if property_data:
+                save(property_data)
+            else:
+                failed.append(url)
+
+        await asyncio.gather(*[fetch_and_save(url) for url in urls])
+
+    if tls_failed:
+        print(f"\n{len(tls_failed)}/{len(urls)} HTTP fetches failed TLS verification and will fall back "
+              f"to the browser; set IGNORE_CERT_ERRORS = True in restricted environments")
+    return failed
+
+
 def scrape_property_page(driver, url):
-    """Scrape data from a single property page"""
+    """Scrape a single property page with the browser (fallback for failed HTTP fetches)"""
     print(f"Scraping property: {url}")
-    driver.get(url)
 
     try:
-        # Wait for the page to load
-        try:
-            WebDriverWait(driver, 15).until(
-                EC.visibility_of_element_located((By.XPATH, "//h1[@data-testid='title-listing-detail']"))
-            )
-        except TimeoutException:
-            # Try alternative loading indicator
-            WebDriverWait(driver, 15).until(
-                EC.visibility_of_element_located((By.XPATH, "//div[@class='listing-detail']"))
-            )
+        driver.get(url)
 
-        # Extract JSON data from script tag
-        script_element = driver.find_element(By.XPATH, "//script[@id='__NEXT_DATA__']")
-        json_data = json.loads(script_element.get_attribute('textContent'))
+        # Wait for any of the loading indicators under a single timeout
+        WebDriverWait(driver, 10).until(EC.any_of(
+            EC.presence_of_element_located(SEL_NEXT_DATA),
+            EC.presence_of_element_located(SEL_TITLE),
+            EC.presence_of_element_located(SEL_LISTING_DETAIL),
+        ))
 
-        # Extract listing data
-        page_props = json_data.get('props', {}).get('pageProps', {})
-        listing = page_props.get('listing', {})
+        # Extract JSON data from script tag
+        json_data = driver.execute_script(NEXT_DATA_JS)
 
-        if not listing:
+        property_data = parse_listing(json_data, url)
+        if not property_data:
             print("  - No listing data found in JSON")
             take_screenshot(driver, "no_listing_data")
-            return None
-
-        # Extract key details
-        location = listing.get('location', {})
-        broker = listing.get('broker', {})
-        images = [img.get('url', '') for img in listing.get('images', []) if img.get('url')]
-
-        # Compile property data
-        return {
-            "url": url,
-            "title": listing.get('title', ''),
-            "price": listing.get('price', {}).get('value', ''),
-            "currency": listing.get('price', {}).get('currency', 'COP'),
-            "location": location.get('formattedAddress', ''),
-            "neighborhood": location.get('neighborhood', {}).get('name', ''),
-            "city": location.get('city', {}).get('name', ''),
-            "property_type": listing.get('propertyType', ''),
-            "area": listing.get('area', ''),
-            "rooms": listing.get('rooms', ''),
-            "bathrooms": listing.get('bathrooms', ''),
-            "parking": listing.get('parking', ''),
-            "stratum": listing.get('stratum', ''),
-            "status": listing.get('status', ''),
-            "description": listing.get('description', '')[:500].replace('\n', ' ') + "...",
-            "features": ", ".join(listing.get('features', [])),
-            "broker": broker.get('name', ''),
-            "broker_phone": broker.get('phone', ''),
-            "images": "; ".join(images),
-            "virtual_tour": listing.get('virtualTourUrl', ''),
-            "property_id": listing.get('id', ''),
-            "scraped_at": time.strftime("%Y-%m-%d %H:%M:%S")
-        }
+            flush_screenshots()
+        return property_data
 
     except Exception as e:
         print(f"  - Error scraping property: {str(e)}")
         take_screenshot(driver, "property_error")
+        flush_screenshots()
         return None
 
 
+def reset_browser(driver):
+    """Drop caches, cookies and the current page's JS state between listings"""
+    if hasattr(driver, "execute_cdp_cmd"):
+        driver.execute_cdp_cmd("Network.clearBrowserCache", {})
+        driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+    else:
+        driver.delete_all_cookies()
+    driver.get("about:blank")
+
+
+def scrape_one(urls, rows):
+    """Scrape a chunk of property pages in a dedicated browser (pool worker), sending each row back on rows"""
+    driver = init_driver()
+    scraped = 0
+    try:
+        for i, url in enumerate(urls, 1):
+            print(f"\nRetrying property {i}/{len(urls)} in browser: {url[:70]}...")
+            # One bad listing only costs itself, not the rows collected so far
+            try:
+                property_data = scrape_property_page(driver, url)
+                if property_data:
+                    rows.put(property_data)
+                    scraped += 1
+                if i % RESET_EVERY == 0:
+                    reset_browser(driver)
+            except Exception as e:
+                print(f"  - Browser error on {url}: {str(e)}")
+                flush_screenshots()
+    finally:
+        driver.quit()
+    return scraped
+
+
+def drain_rows(rows, save):
+    """Save every row the browser workers have sent so far"""
+    while True:
+        try:
+            property_data = rows.get_nowait()
+        except queue.Empty:
+            return
+        save(property_data)
+
+
+def scrape_in_browsers(urls, save):
+    """Shard property URLs across a pool of browser workers, saving each row as it arrives"""
+    workers = min(BROWSER_WORKERS, len(urls))
+    url_chunks = [urls[i::workers] for i in range(workers)]
+    with Manager() as manager:
+        rows = manager.Queue()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_set_driver,
+                                 initargs=(None if GRID_URL else get_driver_path(),)) as ex:
+            futures = {ex.submit(scrape_one, chunk, rows): chunk for chunk in url_chunks}
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=1, return_when=FIRST_COMPLETED)
+                drain_rows(rows, save)
+                for future in done:
+                    # One broken browser must not cost the other workers' results
+                    try:
+                        future.result()
+                    except Exception as e:
+                        print(f"Browser worker failed on {len(futures[future])} properties: {str(e)}")
+        drain_rows(rows, save)
+
+
+def get_page_html(driver):
+    """Serialize the current DOM, over CDP when available"""
+    if not hasattr(driver, "execute_cdp_cmd"):
+        return driver.page_source
+    root = driver.execute_cdp_cmd("DOM.getDocument", {})["root"]
+    return driver.execute_cdp_cmd("DOM.getOuterHTML", {"nodeId": root["nodeId"]})["outerHTML"]
+
+
+def extract_next_data_links(driver):
+    """Read listing URLs from the search page's __NEXT_DATA__ JSON"""
+    data = driver.execute_script(NEXT_DATA_JS)
+    results = data.get("props", {}).get("pageProps", {}).get("results", [])
+
+    links = []
+    for result in results:
+        link = result.get("link") or ""
+        if "/inmueble/" in link or "/proyecto/" in link:
+            links.append(urljoin(SEARCH_URL, link))
+    return list(dict.fromkeys(links))
+
+
 def scrape_search_results(driver):
-    """Scrape property listings using multiple detection methods"""
+    """Collect property listing URLs using multiple detection methods"""
     print(f"Navigating to search page: {SEARCH_URL}")
     driver.get(SEARCH_URL)
-    time.sleep(3)  # Initial sleep to let page load
+    try:
+        WebDriverWait(driver, 15).until(
+            EC.presence_of_element_located(SEL_ANY_CARDS)
+        )
+    except TimeoutException:
+        print("Listings container not found yet - continuing with fallback detection")
 
     # Save initial page screenshot
     take_screenshot(driver, "initial_page")
@@ -145,12 +440,17 @@ def scrape_search_results(driver):
         )
         accept_button.click()
         print("Accepted cookies")
-        time.sleep(1)
-        take_screenshot(driver, "after_cookies")
     except:
         print("No cookie dialog found")
+    else:
+        try:
+            WebDriverWait(driver, 5).until(EC.invisibility_of_element(accept_button))
+        except TimeoutException:
+            print("Cookie dialog still visible after accepting")
+        take_screenshot(driver, "after_cookies")
 
-    properties = []
+    all_links = []
+    seen = set()
     page = 1
 
     while page <= MAX_PAGES:
@@ -162,105 +462,83 @@ def scrape_search_results(driver):
             # Scroll to load all content
             print("Scrolling to load content...")
             for _ in range(2):
+                height = driver.execute_script("return document.body.scrollHeight;")
                 driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                time.sleep(2)
+                # Wait for lazy-loaded cards to grow the page
+                try:
+                    WebDriverWait(driver, 5).until(
+                        lambda d: d.execute_script("return document.body.scrollHeight;") > height
+                    )
+                except TimeoutException:
+                    print("  - No more content loaded after scroll")
+                    break
             take_screenshot(driver, f"after_scroll_page_{page}")
 
-            # Try multiple methods to find property cards
-            cards = []
+            # Try each card detection method in priority order, in a single round-trip
             print("Attempting to locate property cards...")
+            card_selector, card_count = driver.execute_script(COUNT_CARDS_JS, CARD_SELECTORS)
+            if card_count:
+                print(f"Found {card_count} listings using {card_selector}")
 
-            # Method 1: data-testid attribute
-            try:
-                cards = driver.find_elements(By.CSS_SELECTOR, "div[data-testid='m2-card-listings-container']")
-                print(f"Found {len(cards)} listings using data-testid method")
-            except NoSuchElementException:
-                print("No listings found using data-testid method")
-
-            # Method 2: Class-based selector if first method failed
-            if not cards:
-                try:
-                    cards = driver.find_elements(By.CSS_SELECTOR, "div.m2-card-listing")
-                    print(f"Found {len(cards)} listings using class-based method")
-                except NoSuchElementException:
-                    print("No listings found using class-based method")
-
-            # Method 3: Generic card detection
-            if not cards:
-                try:
-                    cards = driver.find_elements(By.CSS_SELECTOR, "div[class*='card']")
-                    print(f"Found {len(cards)} listings using generic card method")
-                except NoSuchElementException:
-                    print("No listings found using generic card method")
-
-            # If still no cards, show page source for debugging
-            if not cards:
+            # If no cards, save page source for debugging
+            if not card_count:
                 print("No property cards found on the page")
-                page_source = driver.page_source
-                with open(f"{DEBUG_DIR}/page_{page}_source.html", "w", encoding="utf-8") as f:
-                    f.write(page_source)
-                print(f"Saved page source to {DEBUG_DIR}/page_{page}_source.html")
+                if DEBUG:
+                    with open(f"{DEBUG_DIR}/page_{page}_source.html", "w", encoding="utf-8") as f:
+                        f.write(get_page_html(driver))
+                    print(f"Saved page source to {DEBUG_DIR}/page_{page}_source.html")
                 take_screenshot(driver, f"no_cards_page_{page}")
+                flush_screenshots()
                 break
 
-            # Extract URLs from cards
+            # Read listing URLs from the page's embedded JSON
             links = []
-            for card in cards:
-                try:
-                    # Try to find link inside card
-                    try:
-                        link = card.find_element(By.TAG_NAME, "a")
-                    except NoSuchElementException:
-                        # Look for any link inside the card
-                        link = card.find_element(By.CSS_SELECTOR, "a")
-
-                    href = link.get_attribute('href')
-                    if href and ("/inmueble/" in href or "/proyecto/" in href):
-                        links.append(href)
-                except Exception as e:
-                    print(f"  - Error extracting link: {str(e)}")
-                    continue
+            try:
+                links = [url for url in extract_next_data_links(driver) if url not in seen]
+                print(f"Found {len(links)} new listing URLs in __NEXT_DATA__")
+            except Exception as e:
+                print(f"  - Error reading __NEXT_DATA__: {str(e)}")
 
-            # Remove duplicates
-            links = list(set(links))
-            print(f"Found {len(links)} unique listing URLs")
+            # Fall back to the cards if the JSON had nothing new (client-side
+            # pagination does not refresh __NEXT_DATA__); all unique hrefs come back in one call
+            if not links:
+                links = driver.execute_script(
+                    "return Array.from(new Set(Array.from(document.querySelectorAll("
+                    "\"div[data-testid='m2-card-listings-container'] a, div.m2-card-listing a, div[class*='card'] a\"))"
+                    ".map(a => a.href)"
+                    ".filter(h => h.includes('/inmueble/') || h.includes('/proyecto/'))));"
+                )
+                links = [url for url in links if url not in seen]
+                print(f"Found {len(links)} new listing URLs in cards")
 
             if not links:
                 print("No valid links found - stopping")
                 take_screenshot(driver, "no_valid_links")
+                flush_screenshots()
                 break
 
-            # Scrape each property
-            for i, url in enumerate(links, 1):
-                print(f"\nProcessing property {i}/{len(links)}: {url[:70]}...")
-                property_data = scrape_property_page(driver, url)
-                if property_data:
-                    properties.append(property_data)
-                time.sleep(2)  # Pause between requests
+            seen.update(links)
+            all_links.extend(links)
 
             # Go to next page
             if page < MAX_PAGES:
                 print("Attempting to navigate to next page...")
                 try:
-                    # Try multiple ways to find next button
-                    try:
-                        next_button = driver.find_element(By.XPATH, "//a[@aria-label='Siguiente página']")
-                    except:
-                        try:
-                            next_button = driver.find_element(By.XPATH, "//a[contains(@class, 'm2-pagination__next')]")
-                        except:
-                            next_button = driver.find_element(By.XPATH, "//a[contains(text(), 'Siguiente')]")
+                    # All next button locators in one lookup
+                    next_buttons = driver.find_elements(*SEL_NEXT_BUTTON)
+                    next_button = next_buttons[0] if next_buttons else None
 
                     if next_button:
+                        first_listing = driver.execute_script(FIRST_LISTING_JS)
                         driver.execute_script("arguments[0].scrollIntoView();", next_button)
                         driver.execute_script("arguments[0].click();", next_button)
 
-                        # Wait for new page to load
+                        # Client-side pagination keeps the result containers, so wait
+                        # for the first listing link to change instead
                         WebDriverWait(driver, 15).until(
-                            EC.presence_of_element_located((By.XPATH,
-                                                            "//div[contains(@class, 'm2-card-listing') or @data-testid='m2-card-listings-container']"))
+                            lambda d: d.execute_script(FIRST_LISTING_JS) not in (None, first_listing)
                         )
-                        time.sleep(3)
+                        WebDriverWait(driver, 15).until(EC.presence_of_element_located(SEL_ANY_CARDS))
                         page += 1
                         take_screenshot(driver, f"after_navigation_page_{page}")
                     else:
@@ -269,6 +547,7 @@ def scrape_search_results(driver):
                 except Exception as e:
                     print(f"Error navigating to next page: {str(e)}")
                     take_screenshot(driver, "next_page_error")
+                    flush_screenshots()
                     break
             else:
                 break
@@ -276,9 +555,10 @@ def scrape_search_results(driver):
         except Exception as e:
             print(f"Error processing page {page}: {str(e)}")
             take_screenshot(driver, f"page_{page}_error")
+            flush_screenshots()
             break
 
-    return properties
+    return all_links
 
 
 def main():
@@ -286,26 +566,58 @@ def main():
     driver = init_driver()
 
     try:
-        # Scrape properties
-        results = scrape_search_results(driver)
-
-        if results:
-            # Save to CSV
-            with open(OUTPUT_FILE, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=results[0].keys())
-                writer.writeheader()
-                writer.writerows(results)
-            print(f"\nSuccess! Saved {len(results)} properties to {OUTPUT_FILE}")
-        else:
-            print("No data scraped")
-
+        # Collect listing URLs from the search pages
+        links = scrape_search_results(driver)
     except Exception as e:
         print(f"Main error: {str(e)}")
         take_screenshot(driver, "main_error")
+        flush_screenshots()
+        return
     finally:
         driver.quit()
         print("Browser closed")
 
+    print(f"\nCollected {len(links)} listing URLs")
+    if not links:
+        # Leave any previous results file untouched
+        print("No data scraped")
+        return
+
+    saved = 0
+    try:
+        # Stream rows to a partial file so a failed run never clobbers previous results
+        with open(PARTIAL_FILE, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
+            writer.writeheader()
+
+            def save(property_data):
+                nonlocal saved
+                writer.writerow(property_data)
+                saved += 1
+                if saved % FLUSH_EVERY == 0:
+                    f.flush()
+
+            # Fetch all properties concurrently over HTTP
+            failed_links = asyncio.run(fetch_listings(links, save))
+
+            # Retry failed fetches across a pool of browsers
+            if failed_links:
+                print(f"\nRetrying {len(failed_links)} properties in browsers...")
+                scrape_in_browsers(failed_links, save)
+
+        if saved:
+            os.replace(PARTIAL_FILE, OUTPUT_FILE)
+            print(f"\nSuccess! Saved {saved} properties to {OUTPUT_FILE}")
+        else:
+            os.remove(PARTIAL_FILE)
+            print("No data scraped")
+
+    except Exception as e:
+        print(f"Main error: {str(e)}")
+        if saved:
+            print(f"Partial results ({saved} properties) kept in {PARTIAL_FILE}")
+        flush_screenshots()
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file